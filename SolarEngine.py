@@ -0,0 +1,1558 @@
+"""
+Local solar-event engine for SunriseSunset.py.
+Computes first light, dawn, sunrise, sunset and last light with the NOAA solar
+position algorithm, so the times themselves need no network request.
+Times are returned as minutes after local midnight; NaN means the event does not happen.
+"""
+
+# Import libraries
+import functools
+import math
+import os
+import tempfile
+import numpy as np
+from numpy.polynomial import chebyshev
+
+# Solar altitudes (degrees) that define each event.
+# Sunrise/sunset use the standard -0.833 (34' of refraction plus the sun's 16' semi-diameter).
+SUNRISE_ALTITUDE = -50.0 / 60.0
+CIVIL_ALTITUDE = -6.0
+NAUTICAL_ALTITUDE = -12.0
+ASTRONOMICAL_ALTITUDE = -18.0
+
+# Photographers' golden hour runs from the sun at 6 degrees down to -4 degrees,
+# where the blue hour starts (and lasts until -6 degrees)
+GOLDEN_HOUR_ALTITUDE = 6.0
+BLUE_HOUR_ALTITUDE = -4.0
+
+# Event name, solar altitude and whether the sun is rising, in the order
+# (and with the names) that api.sunrisesunset.io uses
+EVENTS = (
+    ("first_light", ASTRONOMICAL_ALTITUDE, True),
+    ("dawn", CIVIL_ALTITUDE, True),
+    ("sunrise", SUNRISE_ALTITUDE, True),
+    ("sunset", SUNRISE_ALTITUDE, False),
+    ("last_light", ASTRONOMICAL_ALTITUDE, False),
+)
+
+# Standard atmosphere for refraction: 1010 hPa and 10 degrees C give the usual
+# 34 arcminutes at the horizon; the sun's semi-diameter is 16 arcminutes
+STANDARD_PRESSURE = 1010.0
+STANDARD_TEMPERATURE = 10.0
+HORIZON_REFRACTION = 34.0 / 60.0
+SUN_SEMI_DIAMETER = 16.0 / 60.0
+
+# Compact grids store int16 minutes after local midnight, with this sentinel
+# for events that do not happen (polar night or midnight sun)
+NO_EVENT_MINUTES = np.iinfo(np.int16).min
+
+# Terrain horizon profiles are stored as int16 hundredths of a degree, one value
+# per equal azimuth bin starting at north (bin centres at (i + 0.5) * 360 / bins)
+HORIZON_PROFILE_SCALE = 100
+
+# Clear-sky irradiance (W/m^2): the solar constant, and the Meinel/Laue model's
+# reference value at 1 AU that its direct-beam formula is scaled from
+SOLAR_CONSTANT = 1361.0
+MEINEL_SOLAR_CONSTANT = 1353.0
+
+# Bands returned by twilight_bands, from darkest to lightest
+TWILIGHT_BANDS = ("night", "astronomical", "nautical", "civil", "day")
+
+# Moon positions are sampled hourly at these UT hours around each date (covering any
+# local day for UTC offsets from -12 to +14 hours) and interpolated in between.
+# The low-precision lunar series (Astronomical Almanac) is good to about 0.3 degrees,
+# so moonrise and moonset are within a couple of minutes.
+MOON_SAMPLE_HOURS = np.arange(-15.0, 40.0)
+
+# Classes returned by classify_daylight
+NIGHT = 0
+CIVIL_TWILIGHT = 1
+DAY = 2
+
+# Altitude and rising flag of each event, by name
+EVENT_DEFINITIONS = {name: (altitude, rising) for name, altitude, rising in EVENTS}
+
+# Julian day of the Unix epoch (1970-01-01 00:00 UT) and of J2000.0
+JD_UNIX_EPOCH = 2440587.5
+JD_J2000 = 2451545.0
+
+# Precision tiers for the event solvers (benchmark.py measures both).
+# "fast" uses the short Fourier series for the sun's position, evaluated once per
+# date, and a single pass: within about 1 minute of "precise" up to 60 degrees
+# latitude, except twilight near the polar circles, which can be several minutes
+# off. It is about three times faster than "precise" for bulk jobs; the per-point
+# hour angle then dominates, so it cannot gain much more.
+# "precise" uses the full NOAA series, refined at the event time until it moves
+# by less than a tenth of a second.
+PRECISION_TIERS = ("fast", "precise")
+
+# Numba is optional: when installed, the precise event solver runs as a compiled
+# loop for calls with at least JIT_MIN_ELEMENTS values. Numba is only imported (and
+# the cached kernel loaded) on the first such call, since that costs a few hundred
+# milliseconds, far more than the NumPy solver needs for a single location.
+# Set USE_JIT to False to use the NumPy event solver even when Numba is installed.
+USE_JIT = True
+JIT_MIN_ELEMENTS = 100_000
+
+# Per-date ephemeris samples are taken at these offsets (days) from 0h UT and
+# interpolated, which covers any event time for UTC offsets from -12 to +14 hours.
+# EPHEMERIS_CACHE_SIZE bounds how many dates are kept in the LRU cache.
+EPHEMERIS_SAMPLE_DAYS = np.array([-1.0, 0.0, 1.0, 2.0])
+EPHEMERIS_CACHE_SIZE = 4096
+
+# Ephemerides the event solvers accept for arrays of dates: the full NOAA
+# "series" or the per-year "chebyshev" fits below
+EPHEMERIDES = ("series", "chebyshev")
+
+# Per-year piecewise Chebyshev fits of the ephemeris: each year is split into
+# 32-day segments fitted with degree-6 polynomials, which stays within about
+# 1e-6 degrees of declination and 1e-5 minutes of equation of time.
+# The coefficients are saved (one small .npz file per year) in CACHE_DIR.
+CHEBYSHEV_SEGMENT_DAYS = 32
+CHEBYSHEV_DEGREE = 6
+CACHE_DIR = os.environ.get(
+    "SUNRISESUNSET_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "sunrisesunset"))
+
+# Precomputed event table: latitude bands every LOOKUP_LATITUDE_STEP degrees by
+# day of a reference year, at longitude 0 and UTC. From 1900 to 2100, bilinear
+# interpolation stays within LOOKUP_MAX_ERROR_MINUTES of the precise tier for
+# sunrise and sunset up to 60 degrees latitude and for every event up to 45 degrees.
+# Dawn stays within a minute up to 60 degrees, but first and last light can be
+# several minutes off where astronomical twilight fades out in summer. Results
+# are NaN wherever a neighbouring table entry has no event.
+LOOKUP_LATITUDE_STEP = 0.25
+LOOKUP_REFERENCE_YEAR = 2000
+LOOKUP_MAX_ERROR_MINUTES = 0.5
+TROPICAL_YEAR_DAYS = 365.2422
+
+# Delta-T (TT - UT, seconds) by year, from the historical values tabulated by
+# Espenak and Meeus and their extrapolation to 2150. Between entries it is
+# interpolated linearly; outside the table the Morrison-Stephenson parabola
+# -20 + 32 u^2 (u in centuries from 1820) is used. The ephemerides are evaluated
+# in TT, which matters from a few centuries back (delta-T of an hour or more).
+DELTA_T_YEARS = np.array([
+    -500, -400, -300, -200, -100, 0, 100, 200, 300, 400, 500, 600, 700, 800, 900, 1000,
+    1100, 1200, 1300, 1400, 1500, 1600, 1650, 1700, 1750, 1800, 1850, 1860, 1870, 1880,
+    1890, 1900, 1910, 1920, 1930, 1940, 1950, 1960, 1970, 1980, 1990, 2000, 2005, 2010,
+    2015, 2020, 2025, 2050, 2100, 2150], dtype=float)
+DELTA_T_SECONDS = np.array([
+    17190, 15530, 14080, 12790, 11640, 10580, 9600, 8640, 7680, 6700, 5710, 4740, 3810, 2960, 2200, 1570,
+    1090, 740, 490, 320, 200, 120, 50, 9, 13, 14, 7, 8, 2, -5,
+    -6, -3, 10.4, 21.2, 24.0, 24.3, 29.1, 33.2, 40.2, 50.5, 56.9, 63.8, 64.7, 66.1,
+    67.6, 69.4, 69.2, 93, 203, 328], dtype=float)
+
+# The Gregorian calendar replaced the Julian calendar after 1582-10-04 (Julian),
+# which was followed by 1582-10-15 (Gregorian)
+GREGORIAN_REFORM_JD = 2299160.5
+
+
+# Function definitions
+def julian_day(day):
+    """
+    Returns the Julian day at 0h UT for a date or array of dates.
+    Accepts "YYYY-MM-DD" strings, datetime.date objects or numpy datetime64 values.
+    """
+    days = np.asarray(day, dtype="datetime64[D]").astype(np.int64)
+    return JD_UNIX_EPOCH + days
+
+
+def calendar_to_julian_day(year, month, day, calendar="auto"):
+    """
+    Returns the Julian day at 0h UT (plus any fraction of day) for arrays of
+    calendar years, months and days, without creating date objects (Meeus,
+    Astronomical Algorithms, chapter 7). Years are astronomical (1 BC is 0).
+    calendar is "gregorian", "julian", or "auto" for the Julian calendar before
+    the 1582 reform and the Gregorian calendar from 1582-10-15 on, as historical
+    records use.
+    """
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=float)
+    january_or_february = month <= 2
+    year = np.where(january_or_february, year - 1, year)
+    month = np.where(january_or_february, month + 12, month)
+
+    century = np.floor_divide(year, 100)
+    gregorian_correction = 2 - century + np.floor_divide(century, 4)
+    if calendar == "julian":
+        gregorian_correction = 0
+    elif calendar == "auto":
+        gregorian_correction = np.where((year * 10000 + month * 100 + day) >= 15821015, gregorian_correction, 0)
+    elif calendar != "gregorian":
+        raise ValueError(f"Unknown calendar: {calendar}")
+    return (np.floor(365.25 * (year + 4716)) + np.floor(30.6001 * (month + 1))
+            + day + gregorian_correction - 1524.5)
+
+
+def calendar_dates(year, month, day, calendar="auto"):
+    """
+    Returns datetime64[D] dates for arrays of calendar years, months and days
+    (see calendar_to_julian_day), ready for the other functions in this module.
+    numpy dates are proleptic Gregorian, so Julian-calendar input is converted.
+    """
+    jd = calendar_to_julian_day(year, month, np.floor(day), calendar)
+    return (np.round(jd - JD_UNIX_EPOCH).astype(np.int64)).astype("datetime64[D]")
+
+
+def delta_t(jd):
+    """Returns delta-T (TT - UT, seconds) at the given Julian day(s), from DELTA_T_SECONDS."""
+    year = 2000.0 + (np.asarray(jd, dtype=float) - JD_J2000) / 365.25
+    u = (year - 1820.0) / 100.0
+    outside = (year < DELTA_T_YEARS[0]) | (year > DELTA_T_YEARS[-1])
+    return np.where(outside, -20.0 + 32.0 * u * u, np.interp(year, DELTA_T_YEARS, DELTA_T_SECONDS))
+
+
+def terrestrial_time(jd):
+    """Converts Julian day(s) in UT to TT, the time scale the ephemerides are evaluated in."""
+    jd = np.asarray(jd, dtype=float)
+    return jd + delta_t(jd) / 86400.0
+
+
+def solar_ephemeris(jd):
+    """
+    Returns the solar declination (degrees) and the equation of time (minutes)
+    for the given Julian day(s), following the NOAA solar calculator.
+    """
+    t = (np.asarray(jd, dtype=float) - JD_J2000) / 36525.0
+
+    # Geometric mean longitude and anomaly of the sun, eccentricity of Earth's orbit
+    mean_long = np.radians((280.46646 + t * (36000.76983 + t * 0.0003032)) % 360.0)
+    mean_anom = np.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    eccent = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    # Equation of center, true and apparent longitude
+    center = (np.sin(mean_anom) * (1.914602 - t * (0.004817 + 0.000014 * t))
+              + np.sin(2 * mean_anom) * (0.019993 - 0.000101 * t)
+              + np.sin(3 * mean_anom) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * t)
+    app_long = np.radians(np.degrees(mean_long) + center - 0.00569 - 0.00478 * np.sin(omega))
+
+    # Obliquity of the ecliptic, corrected for nutation
+    mean_obliq = 23.0 + (26.0 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60.0) / 60.0
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+
+    declination = np.degrees(np.arcsin(np.sin(obliq) * np.sin(app_long)))
+
+    y = np.tan(obliq / 2) ** 2
+    eq_time = 4 * np.degrees(y * np.sin(2 * mean_long)
+                             - 2 * eccent * np.sin(mean_anom)
+                             + 4 * eccent * y * np.sin(mean_anom) * np.cos(2 * mean_long)
+                             - 0.5 * y * y * np.sin(4 * mean_long)
+                             - 1.25 * eccent * eccent * np.sin(2 * mean_anom))
+    return declination, eq_time
+
+
+def fast_solar_ephemeris(jd):
+    """
+    Returns the solar declination (degrees) and equation of time (minutes) from
+    the short Fourier series in NOAA's "General Solar Position Calculations".
+    Cheaper than solar_ephemeris but less accurate (see PRECISION_TIERS).
+    """
+    # Fractional year in radians, starting at 0h UT on January 1
+    gamma = 2 * np.pi * (((np.asarray(jd, dtype=float) - 2451544.5) / 365.2422) % 1.0)
+    cos1, sin1 = np.cos(gamma), np.sin(gamma)
+    cos2, sin2 = np.cos(2 * gamma), np.sin(2 * gamma)
+    eq_time = 229.18 * (0.000075 + 0.001868 * cos1 - 0.032077 * sin1
+                        - 0.014615 * cos2 - 0.040849 * sin2)
+    declination = np.degrees(0.006918 - 0.399912 * cos1 + 0.070257 * sin1
+                             - 0.006758 * cos2 + 0.000907 * sin2
+                             - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    return declination, eq_time
+
+
+@functools.lru_cache(maxsize=None)
+def chebyshev_coefficients(year):
+    """
+    Returns (start_jd, declination_coefficients, eq_time_coefficients) for the
+    given year, with one row of coefficients per CHEBYSHEV_SEGMENT_DAYS segment.
+    The fit is loaded from the cache file if it exists; otherwise it is computed
+    from solar_ephemeris and saved for next time.
+    """
+    path = os.path.join(CACHE_DIR, f"chebyshev_{year}_{CHEBYSHEV_SEGMENT_DAYS}_{CHEBYSHEV_DEGREE}.npz")
+    try:
+        with np.load(path) as cached:
+            return float(cached["start"]), cached["declination"], cached["eq_time"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    # Cover the whole year with a day of margin on both sides
+    start = float(julian_day(_new_year(year))) - 1.0
+    end = float(julian_day(_new_year(year + 1))) + 1.0
+    segments = int(np.ceil((end - start) / CHEBYSHEV_SEGMENT_DAYS))
+
+    # All segments share the same nodes on [-1, 1], so they are fitted together
+    x = np.cos(np.pi * (np.arange(4 * CHEBYSHEV_DEGREE) + 0.5) / (4 * CHEBYSHEV_DEGREE))
+    segment_starts = start + CHEBYSHEV_SEGMENT_DAYS * np.arange(segments)
+    jd = segment_starts + (x[:, np.newaxis] + 1.0) * CHEBYSHEV_SEGMENT_DAYS / 2
+    declination, eq_time = solar_ephemeris(jd)
+    declination_coefficients = chebyshev.chebfit(x, declination, CHEBYSHEV_DEGREE).T.copy()
+    eq_time_coefficients = chebyshev.chebfit(x, eq_time, CHEBYSHEV_DEGREE).T.copy()
+
+    # If the cache directory is not writable the fit is simply kept in memory
+    _write_cache_file(path, lambda cache_file: np.savez(
+        cache_file, start=start, declination=declination_coefficients, eq_time=eq_time_coefficients))
+    return start, declination_coefficients, eq_time_coefficients
+
+
+def _write_cache_file(path, write):
+    """
+    Writes a cache file by calling write(file) on a temporary file that then
+    replaces path, so a half-written cache file is never read.
+    Returns False (and leaves no file) if the cache directory is not writable.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                write(temp_file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+def _clenshaw(coefficients, segment, x):
+    """Evaluates, for each element, the Chebyshev series of its segment at x."""
+    columns = coefficients.T
+    two_x = 2.0 * x
+    b1 = columns[-1][segment]
+    b2 = 0.0
+    for k in range(len(columns) - 2, 0, -1):
+        b1, b2 = columns[k][segment] + two_x * b1 - b2, b1
+    return columns[0][segment] + x * b1 - b2
+
+
+def _new_year(year):
+    """Returns January 1 of the given (astronomical) year as a datetime64 date."""
+    return np.datetime64(year - 1970, "Y").astype("datetime64[D]")
+
+
+def _year_of(jd):
+    """Returns the calendar year containing the given (scalar) Julian day."""
+    return int(np.datetime64(int(np.floor(jd - JD_UNIX_EPOCH)), "D").astype("datetime64[Y]").astype(np.int64)) + 1970
+
+
+def chebyshev_ephemeris(jd):
+    """
+    Returns the solar declination (degrees) and equation of time (minutes) like
+    solar_ephemeris, but evaluated from the per-year Chebyshev fits, which costs
+    a handful of multiply-adds per value instead of the full trigonometric series.
+    """
+    jd = np.asarray(jd, dtype=float)
+    declination = np.empty_like(jd)
+    eq_time = np.empty_like(jd)
+
+    # Each year has its own fit; bulk jobs usually span only a few years
+    first_year, last_year = _year_of(jd.min()), _year_of(jd.max())
+    if first_year == last_year:
+        year_index = np.zeros(jd.shape, dtype=np.int64)
+    else:
+        boundaries = julian_day([_new_year(year) for year in range(first_year + 1, last_year + 1)])
+        year_index = np.searchsorted(boundaries, jd, side="right")
+
+    for index, year in enumerate(range(first_year, last_year + 1)):
+        mask = year_index == index
+        start, declination_coefficients, eq_time_coefficients = chebyshev_coefficients(year)
+        position = (jd[mask] - start) / CHEBYSHEV_SEGMENT_DAYS
+        segment = position.astype(np.int64)
+        x = 2.0 * (position - segment) - 1.0
+        declination[mask] = _clenshaw(declination_coefficients, segment, x)
+        eq_time[mask] = _clenshaw(eq_time_coefficients, segment, x)
+    return declination, eq_time
+
+
+# Maps samples at EPHEMERIS_SAMPLE_DAYS to the coefficients of the cubic through them
+_SAMPLES_TO_CUBIC = np.linalg.inv(np.vander(EPHEMERIS_SAMPLE_DAYS, increasing=True)).T
+
+
+@functools.lru_cache(maxsize=EPHEMERIS_CACHE_SIZE)
+def _cached_ephemeris_polynomials(day_number):
+    """Returns the declination and equation-of-time cubics for one date (days since 1970-01-01)."""
+    declination, eq_time = solar_ephemeris(terrestrial_time(JD_UNIX_EPOCH + day_number + EPHEMERIS_SAMPLE_DAYS))
+    declination = declination @ _SAMPLES_TO_CUBIC
+    eq_time = eq_time @ _SAMPLES_TO_CUBIC
+    declination.flags.writeable = False
+    eq_time.flags.writeable = False
+    return declination, eq_time
+
+
+def ephemeris_polynomials(day_number, ephemeris="series"):
+    """
+    Returns cubic polynomials (coefficients in increasing order, in the fraction of
+    a day after 0h UT) for the declination and equation of time of a date or array
+    of dates (days since 1970-01-01), to be evaluated with interpolate_ephemeris.
+    The terms depend only on the date, so for a single date they are computed
+    once, cached, and shared by every location. For arrays of dates, ephemeris
+    selects the full "series" or the per-year "chebyshev" fits; a single date
+    always uses the cached series, which is already cheaper than a fit.
+    """
+    if ephemeris not in EPHEMERIDES:
+        raise ValueError(f"Unknown ephemeris: {ephemeris}")
+    if np.ndim(day_number) == 0:
+        return _cached_ephemeris_polynomials(int(day_number))
+    jd = terrestrial_time(JD_UNIX_EPOCH + np.asarray(day_number)[..., np.newaxis] + EPHEMERIS_SAMPLE_DAYS)
+    if ephemeris == "chebyshev":
+        declination, eq_time = chebyshev_ephemeris(jd)
+    else:
+        declination, eq_time = solar_ephemeris(jd)
+    return declination @ _SAMPLES_TO_CUBIC, eq_time @ _SAMPLES_TO_CUBIC
+
+
+def interpolate_ephemeris(polynomials, fraction):
+    """
+    Returns the solar declination (degrees) and equation of time (minutes) at the
+    given fraction of a day after 0h UT, from the ephemeris_polynomials cubics.
+    """
+    declination, eq_time = polynomials
+    x = np.asarray(fraction, dtype=float)
+    return (declination[..., 0] + x * (declination[..., 1] + x * (declination[..., 2] + x * declination[..., 3])),
+            eq_time[..., 0] + x * (eq_time[..., 1] + x * (eq_time[..., 2] + x * eq_time[..., 3])))
+
+
+def hour_angle(latitude, declination, altitude):
+    """
+    Returns the hour angle (degrees) at which the sun reaches the given altitude.
+    NaN means the sun never reaches that altitude on that day.
+    """
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+    cos_ha = ((np.sin(np.radians(altitude)) - np.sin(lat) * np.sin(dec))
+              / (np.cos(lat) * np.cos(dec)))
+    with np.errstate(invalid="ignore"):
+        return np.degrees(np.arccos(cos_ha))
+
+
+def _event_kernel(latitude, longitude, offset_minutes, altitude, sign, declination_cubic,
+                  eq_time_cubic, iterations, tolerance, out):
+    """
+    Precise event solver as one fused loop over flat arrays, compiled by Numba
+    when available. declination_cubic and eq_time_cubic hold one row per element,
+    or a single row shared by all of them.
+    """
+    shared = declination_cubic.shape[0] == 1
+    for i in range(out.shape[0]):
+        row = 0 if shared else i
+        d0, d1, d2, d3 = declination_cubic[row, 0], declination_cubic[row, 1], declination_cubic[row, 2], declination_cubic[row, 3]
+        e0, e1, e2, e3 = eq_time_cubic[row, 0], eq_time_cubic[row, 1], eq_time_cubic[row, 2], eq_time_cubic[row, 3]
+        sin_lat = math.sin(math.radians(latitude[i]))
+        cos_lat = math.cos(math.radians(latitude[i]))
+        sin_alt = math.sin(math.radians(altitude[i]))
+        noon = 720.0 - 4.0 * longitude[i] + offset_minutes[i]
+
+        # Start six hours from noon, near a typical event time. If the sun does not
+        # reach the altitude there (the first or last day of a polar night or day),
+        # retry once from noon, where the crossing is
+        minutes = noon + sign * 360.0
+        retried = False
+        for _ in range(iterations):
+            x = (minutes - offset_minutes[i]) / 1440.0
+            declination = math.radians(d0 + x * (d1 + x * (d2 + x * d3)))
+            eq_time = e0 + x * (e1 + x * (e2 + x * e3))
+            cos_ha = (sin_alt - sin_lat * math.sin(declination)) / (cos_lat * math.cos(declination))
+            if not -1.0 <= cos_ha <= 1.0:
+                if retried:
+                    minutes = math.nan
+                    break
+                retried = True
+                minutes = noon
+                continue
+            new_minutes = noon - eq_time + sign * 4.0 * math.degrees(math.acos(cos_ha))
+            converged = abs(new_minutes - minutes) < tolerance
+            minutes = new_minutes
+            if converged:
+                break
+        out[i] = minutes
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_event_kernel():
+    """Returns _event_kernel compiled by Numba (loaded from its cache when possible), or None without Numba."""
+    try:
+        import numba
+    except ImportError:
+        return None
+    return numba.njit(cache=True)(_event_kernel)
+
+
+def event_time(latitude, longitude, day, utc_offset=0.0, altitude=SUNRISE_ALTITUDE,
+               rising=True, iterations=8, ephemeris="series", precision="precise",
+               tolerance=1e-3):
+    """
+    Returns the time (minutes after local midnight) at which the sun crosses the
+    given altitude on the given day. The first pass evaluates the ephemeris six
+    hours from local solar noon; each further pass re-evaluates it at the previous estimate,
+    until no time moves by more than tolerance minutes (at most iterations passes).
+    precision="fast" makes a single pass with fast_solar_ephemeris instead, so it
+    only accepts the default ephemeris.
+    """
+    if ephemeris not in EPHEMERIDES:
+        raise ValueError(f"Unknown ephemeris: {ephemeris}")
+    if precision == "fast" and ephemeris != "series":
+        raise ValueError(f'The fast tier has its own ephemeris; ephemeris="{ephemeris}" needs precision="precise"')
+    day_number = np.asarray(day, dtype="datetime64[D]").astype(np.int64)
+    longitude = np.asarray(longitude, dtype=float)
+    offset_minutes = np.asarray(utc_offset, dtype=float) * 60.0
+    sign = -1.0 if rising else 1.0
+
+    # Start from solar noon, ignoring the equation of time
+    minutes = 720.0 - 4.0 * longitude + offset_minutes
+
+    if precision == "fast":
+        # Evaluate the series once per date, at 0h and 24h UT, and interpolate linearly
+        # to six hours from each location's noon, near a typical event time
+        declination, eq_time = fast_solar_ephemeris(JD_UNIX_EPOCH + day_number[..., np.newaxis] + np.array([0.0, 1.0]))
+        fraction = (minutes + sign * 360.0 - offset_minutes) / 1440.0
+        declination = declination[..., 0] + fraction * (declination[..., 1] - declination[..., 0])
+        eq_time = eq_time[..., 0] + fraction * (eq_time[..., 1] - eq_time[..., 0])
+        solar_noon = 720.0 - 4.0 * longitude - eq_time + offset_minutes
+        return solar_noon + sign * 4.0 * hour_angle(latitude, declination, altitude)
+    if precision != "precise":
+        raise ValueError(f"Unknown precision: {precision}")
+
+    shape = np.broadcast_shapes(np.shape(latitude), longitude.shape, offset_minutes.shape,
+                                day_number.shape, np.shape(altitude))
+    declination_cubic, eq_time_cubic = ephemeris_polynomials(day_number, ephemeris)
+
+    kernel = compiled_event_kernel() if USE_JIT and math.prod(shape) >= JIT_MIN_ELEMENTS else None
+    if kernel is not None:
+        out = np.empty(shape)
+        flat = [np.ascontiguousarray(np.broadcast_to(value, shape), dtype=float).reshape(-1)
+                for value in (latitude, longitude, offset_minutes, altitude)]
+        cubics = [np.ascontiguousarray(np.broadcast_to(cubic, shape + (4,)) if cubic.ndim > 1 else cubic).reshape(-1, 4)
+                  for cubic in (declination_cubic, eq_time_cubic)]
+        kernel(*flat, sign, *cubics, iterations, tolerance, out.reshape(-1))
+        return out
+
+    # Broadcast everything so each pass only has to revisit the unconverged values
+    latitude = np.broadcast_to(latitude, shape)
+    longitude = np.broadcast_to(longitude, shape)
+    offset_minutes = np.broadcast_to(offset_minutes, shape)
+    altitude = np.broadcast_to(altitude, shape)
+    if declination_cubic.ndim > 1:
+        declination_cubic = np.broadcast_to(declination_cubic, shape + (4,))
+        eq_time_cubic = np.broadcast_to(eq_time_cubic, shape + (4,))
+
+    # Start six hours from noon, near a typical event time. Where the sun does not
+    # reach the altitude there (the first or last day of a polar night or day),
+    # retry once from noon, where the crossing is
+    noon = np.broadcast_to(minutes, shape)
+    minutes = np.array(np.broadcast_to(minutes + sign * 360.0, shape))
+    active = np.ones(shape, dtype=bool)
+    retried = np.zeros(shape, dtype=bool)
+    for _ in range(iterations):
+        if declination_cubic.ndim > 1:
+            polynomials = (declination_cubic[active], eq_time_cubic[active])
+        else:
+            polynomials = (declination_cubic, eq_time_cubic)
+        offset = offset_minutes[active]
+        declination, eq_time = interpolate_ephemeris(polynomials, (minutes[active] - offset) / 1440.0)
+        solar_noon = 720.0 - 4.0 * longitude[active] - eq_time + offset
+        new_minutes = solar_noon + sign * 4.0 * hour_angle(latitude[active], declination, altitude[active])
+        retry = np.isnan(new_minutes) & ~retried[active]
+        new_minutes[retry] = noon[active][retry]
+        retried[active] |= retry
+        converged = ~(np.abs(new_minutes - minutes[active]) >= tolerance) & ~retry
+        minutes[active] = new_minutes
+        active[active] = ~converged
+        if not active.any():
+            break
+    return minutes
+
+
+def polar_masks(latitude, longitude, day, altitude=SUNRISE_ALTITUDE):
+    """
+    Returns two boolean arrays (never_rises, never_sets) saying whether the sun
+    stays below, or above, the given altitude all day (polar night or midnight
+    sun for the default altitude). Evaluated at local solar noon, for any mix of
+    location and date arrays, with no per-element branches.
+    """
+    day_number = np.asarray(day, dtype="datetime64[D]").astype(np.int64)
+    longitude = np.asarray(longitude, dtype=float)
+    declination, _ = interpolate_ephemeris(ephemeris_polynomials(day_number),
+                                           0.5 - longitude / 360.0)
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+    cos_ha = ((np.sin(np.radians(altitude)) - np.sin(lat) * np.sin(dec))
+              / (np.cos(lat) * np.cos(dec)))
+    return cos_ha > 1.0, cos_ha < -1.0
+
+
+def horizon_altitude(elevation_m=0.0, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Returns the solar altitude (degrees) at sunrise/sunset for an observer at
+    elevation_m metres, with the air pressure (hPa) and temperature (degrees C)
+    at the observer. Accounts for the sun's semi-diameter, refraction scaled for
+    the air density, and the dip of the horizon seen from above sea level.
+    Works on scalars or per-point arrays; the defaults give the standard -0.833.
+    """
+    refraction = (HORIZON_REFRACTION * (np.asarray(pressure, dtype=float) / STANDARD_PRESSURE)
+                  * (283.0 / (273.0 + np.asarray(temperature, dtype=float))))
+    # Dip of the horizon is about 1.76 arcminutes times the square root of the height in metres
+    dip = 1.76 / 60.0 * np.sqrt(np.maximum(np.asarray(elevation_m, dtype=float), 0.0))
+    return -(SUN_SEMI_DIAMETER + refraction + dip)
+
+
+def event_altitudes(elevation_m=0.0, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Returns the altitude of each of the five events for the given observer.
+    Only sunrise and sunset move; twilight is defined by fixed solar depressions.
+    """
+    altitudes = {name: altitude for name, altitude, _ in EVENTS}
+    altitudes["sunrise"] = altitudes["sunset"] = horizon_altitude(elevation_m, pressure, temperature)
+    return altitudes
+
+
+def sun_events(latitude, longitude, day, utc_offset=0.0, ephemeris="series", precision="precise",
+               elevation_m=0.0, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Returns a dictionary of the five daily events (minutes after local midnight),
+    keyed by the same names as the sunrisesunset.io API results.
+    precision selects one of PRECISION_TIERS; elevation_m, pressure and
+    temperature adjust sunrise and sunset (see horizon_altitude).
+    """
+    altitudes = event_altitudes(elevation_m, pressure, temperature)
+    return {name: event_time(latitude, longitude, day, utc_offset, altitudes[name], rising,
+                             ephemeris=ephemeris, precision=precision)
+            for name, _, rising in EVENTS}
+
+
+def format_time(minutes):
+    """Formats minutes after local midnight as a 12-hour clock string (e.g. 6:45:12 AM)."""
+    if minutes is None or np.isnan(minutes):
+        return "N/A"
+    seconds = int(round(float(minutes) * 60.0)) % 86400
+    hours, seconds = divmod(seconds, 3600)
+    mins, seconds = divmod(seconds, 60)
+    suffix = "AM" if hours < 12 else "PM"
+    return f"{(hours % 12) or 12}:{mins:02d}:{seconds:02d} {suffix}"
+
+
+def date_range(start, end):
+    """Returns the dates from start to end (both inclusive) as a datetime64[D] array."""
+    return np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+
+
+def sun_events_for_dates(latitude, longitude, dates, utc_offset=0.0, ephemeris="series",
+                         precision="precise", elevation_m=0.0, pressure=STANDARD_PRESSURE,
+                         temperature=STANDARD_TEMPERATURE):
+    """
+    Returns the five daily events for one location over an array of dates,
+    computed in a single vectorized pass. Each event is an array with one entry
+    per date (minutes after local midnight); "date" holds the dates themselves.
+    Bulk jobs can pass ephemeris="chebyshev" to use the cached per-year fits.
+    "never_rises" and "never_sets" mark the polar night and midnight sun dates.
+    elevation_m, pressure and temperature can be single values or one per date.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    events = sun_events(float(latitude), float(longitude), dates, utc_offset, ephemeris, precision,
+                        elevation_m, pressure, temperature)
+    events["date"] = dates
+    events["never_rises"], events["never_sets"] = polar_masks(
+        float(latitude), float(longitude), dates, horizon_altitude(elevation_m, pressure, temperature))
+    return events
+
+
+def sun_events_for_locations(latitudes, longitudes, day, utc_offset=0.0, precision="precise",
+                             elevation_m=0.0, pressure=STANDARD_PRESSURE,
+                             temperature=STANDARD_TEMPERATURE):
+    """
+    Returns the five daily events for many locations on one date, computed in a
+    single vectorized pass. utc_offset can be one value or one per location.
+    Each event is an array shaped like the (broadcast) latitude/longitude arrays.
+    "never_rises" and "never_sets" mark the locations in polar night or midnight sun.
+    elevation_m, pressure and temperature can be single values or one per location.
+    """
+    latitudes, longitudes = np.broadcast_arrays(np.asarray(latitudes, dtype=float),
+                                                np.asarray(longitudes, dtype=float))
+    day = np.datetime64(day, "D")
+    events = sun_events(latitudes, longitudes, day, utc_offset, precision=precision,
+                        elevation_m=elevation_m, pressure=pressure, temperature=temperature)
+    events["never_rises"], events["never_sets"] = polar_masks(
+        latitudes, longitudes, day, horizon_altitude(elevation_m, pressure, temperature))
+    return events
+
+
+def altitude_crossings(latitude, longitude, day, altitudes, utc_offset=0.0, precision="precise"):
+    """
+    Solves for the times the sun crosses each of a list of altitudes (degrees),
+    e.g. [-18, -12, -6, -4, 6] for twilight, blue hour and golden hour.
+    All altitudes are solved in a single vectorized pass that shares the cached
+    per-date ephemeris; latitude, longitude, day and utc_offset may be arrays.
+    Returns (rising, setting) arrays of minutes after local midnight, shaped like
+    the broadcast inputs plus a last axis with one entry per altitude.
+    """
+    altitudes = np.asarray(altitudes, dtype=float)
+    latitude = np.asarray(latitude, dtype=float)[..., np.newaxis]
+    longitude = np.asarray(longitude, dtype=float)[..., np.newaxis]
+    day = np.asarray(day, dtype="datetime64[D]")[..., np.newaxis]
+    utc_offset = np.asarray(utc_offset, dtype=float)[..., np.newaxis]
+    rising = event_time(latitude, longitude, day, utc_offset, altitudes, True, precision=precision)
+    setting = event_time(latitude, longitude, day, utc_offset, altitudes, False, precision=precision)
+    return rising, setting
+
+
+def next_event(latitudes, longitudes, start, utc_offset=0.0, event="sunrise", max_days=400,
+               chunk_days=32, precision="precise", elevation_m=0.0, pressure=STANDARD_PRESSURE,
+               temperature=STANDARD_TEMPERATURE):
+    """
+    Finds the first date on or after start on which the named event happens, for
+    one location or arrays of them. Dates are scanned chunk_days at a time for all
+    locations still waiting, so a sunrise months away (after a polar night) costs
+    a few vectorized passes rather than a loop per day.
+    Returns (dates, minutes) shaped like the locations; NaT and NaN mean the event
+    does not happen within max_days. Near the poles an event can fall just past
+    (or before) local midnight, so the dates and minutes are normalised to the
+    calendar day on which it actually happens, with minutes in [0, 1440).
+    Within about 0.2 degrees of the poles the sun crosses the horizon only once
+    in a slow spiral, and that crossing can be missed.
+    """
+    _, rising = EVENT_DEFINITIONS[event]
+    altitude = event_altitudes(elevation_m, pressure, temperature)[event]
+    latitudes, longitudes, utc_offset, altitude = np.broadcast_arrays(
+        np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float),
+        np.asarray(utc_offset, dtype=float), np.asarray(altitude, dtype=float))
+    shape = latitudes.shape
+    latitudes, longitudes, utc_offset = latitudes.ravel(), longitudes.ravel(), utc_offset.ravel()
+    altitude = altitude.ravel()
+    found_dates = np.full(latitudes.shape, np.datetime64("NaT"), dtype="datetime64[D]")
+    found_minutes = np.full(latitudes.shape, np.nan)
+    waiting = np.ones(latitudes.shape, dtype=bool)
+
+    start = np.datetime64(start, "D")
+    for chunk_start in range(0, max_days, chunk_days):
+        days = start + np.arange(chunk_start, min(chunk_start + chunk_days, max_days))
+        lat = latitudes[waiting][:, np.newaxis]
+        lng = longitudes[waiting][:, np.newaxis]
+        offset = utc_offset[waiting][:, np.newaxis]
+        minutes = event_time(lat, lng, days, offset, altitude[waiting][:, np.newaxis], rising,
+                             precision=precision)
+
+        # Move events past midnight (or before it) onto the day they happen, and
+        # skip any that then fall before start
+        day_shift = np.floor(np.nan_to_num(minutes / 1440.0))
+        event_days = days + day_shift.astype(np.int64)
+        minutes = minutes - 1440.0 * day_shift
+
+        # First day in the chunk with an event, for each waiting location
+        happens = ~np.isnan(minutes) & (event_days >= start)
+        first = happens.argmax(axis=1)
+        hit = happens.any(axis=1)
+        indices = np.flatnonzero(waiting)[hit]
+        found_dates[indices] = event_days[hit, first[hit]]
+        found_minutes[indices] = minutes[hit, first[hit]]
+        waiting[indices] = False
+        if not waiting.any():
+            break
+    return found_dates.reshape(shape), found_minutes.reshape(shape)
+
+
+def iter_sun_events(latitude, longitude, start, end, utc_offset=0.0, tolerance=1e-3,
+                    max_iterations=8, chunk_days=366, elevation_m=0.0,
+                    pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Yields (date, events) for each date from start to end (inclusive), where events
+    is a dictionary like sun_events returns with float values.
+    Each event is refined until it moves by less than tolerance minutes, starting
+    from the previous day's time for the same event; since that moves by only a few
+    minutes per day, one or two iterations are usually enough. The ephemeris is
+    computed in vectorized chunks of chunk_days, so memory stays flat for long ranges.
+    """
+    sin_lat = math.sin(math.radians(latitude))
+    cos_lat = math.cos(math.radians(latitude))
+    offset_minutes = utc_offset * 60.0
+    # Start from solar noon, ignoring the equation of time, when there is no previous day
+    noon_guess = 720.0 - 4.0 * longitude + offset_minutes
+    previous = {name: math.nan for name, _, _ in EVENTS}
+    altitudes = {name: float(altitude)
+                 for name, altitude in event_altitudes(elevation_m, pressure, temperature).items()}
+
+    chunk_start = np.datetime64(start, "D")
+    last_day = np.datetime64(end, "D")
+    while chunk_start <= last_day:
+        days = np.arange(chunk_start, min(chunk_start + chunk_days, last_day + 1))
+        declination_cubics, eq_time_cubics = ephemeris_polynomials(days.astype(np.int64))
+        declination_cubics = declination_cubics.tolist()
+        eq_time_cubics = eq_time_cubics.tolist()
+
+        for index, day in enumerate(days):
+            d0, d1, d2, d3 = declination_cubics[index]
+            e0, e1, e2, e3 = eq_time_cubics[index]
+            events = {}
+            for name, _, rising in EVENTS:
+                sin_alt = math.sin(math.radians(altitudes[name]))
+                sign = -1.0 if rising else 1.0
+                minutes = previous[name]
+                if math.isnan(minutes):
+                    minutes = noon_guess
+                for _ in range(max_iterations):
+                    fraction = (minutes - offset_minutes) / 1440.0
+                    declination = math.radians(d0 + fraction * (d1 + fraction * (d2 + fraction * d3)))
+                    eq_time = e0 + fraction * (e1 + fraction * (e2 + fraction * e3))
+                    cos_ha = ((sin_alt - sin_lat * math.sin(declination))
+                              / (cos_lat * math.cos(declination)))
+                    if not -1.0 <= cos_ha <= 1.0:
+                        minutes = math.nan
+                        break
+                    new_minutes = (720.0 - 4.0 * longitude - eq_time + offset_minutes
+                                   + sign * 4.0 * math.degrees(math.acos(cos_ha)))
+                    converged = abs(new_minutes - minutes) < tolerance
+                    minutes = new_minutes
+                    if converged:
+                        break
+                events[name] = minutes
+            previous = events
+            yield day, events
+        chunk_start = days[-1] + 1
+
+
+def solar_ephemeris_at(times):
+    """
+    Returns the solar declination (degrees) and equation of time (minutes) at
+    arbitrary UTC instants (datetime64 values or strings). Instants on the same
+    date share that date's cached cubic, so dense time series are cheap.
+    """
+    seconds = np.asarray(times, dtype="datetime64[s]").astype(np.int64)
+    day_number, second_of_day = np.divmod(seconds, 86400)
+    fraction = second_of_day / 86400.0
+    if day_number.size and day_number.min() == day_number.max():
+        return interpolate_ephemeris(ephemeris_polynomials(int(day_number.flat[0])), fraction)
+    unique_days, inverse = np.unique(day_number, return_inverse=True)
+    declination, eq_time = ephemeris_polynomials(unique_days)
+    inverse = inverse.reshape(day_number.shape)
+    return interpolate_ephemeris((declination[inverse], eq_time[inverse]), fraction)
+
+
+def sun_position(latitude, longitude, times, refraction=False):
+    """
+    Returns the solar azimuth (degrees clockwise from north) and elevation
+    (degrees) at the given UTC instants, for any broadcastable mix of location
+    and time arrays. With refraction=True the elevation is the apparent one,
+    corrected for atmospheric refraction as in the NOAA solar calculator.
+    """
+    times = np.asarray(times, dtype="datetime64[s]")
+    declination, eq_time = solar_ephemeris_at(times)
+    utc_minutes = (times.astype(np.int64) % 86400) / 60.0
+
+    # Hour angle from the true solar time (minutes)
+    true_solar_time = utc_minutes + eq_time + 4.0 * np.asarray(longitude, dtype=float)
+    ha = np.radians(true_solar_time / 4.0 - 180.0)
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+
+    sin_elevation = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)
+    elevation = np.degrees(np.arcsin(np.clip(sin_elevation, -1.0, 1.0)))
+    azimuth = (np.degrees(np.arctan2(np.sin(ha), np.cos(ha) * np.sin(lat) - np.tan(dec) * np.cos(lat)))
+               + 180.0) % 360.0
+    if refraction:
+        elevation = elevation + atmospheric_refraction(elevation)
+    return azimuth, elevation
+
+
+def atmospheric_refraction(elevation):
+    """Returns the NOAA approximation of atmospheric refraction (degrees) at the given true elevation."""
+    elevation = np.asarray(elevation, dtype=float)
+    tan_e = np.tan(np.radians(np.clip(elevation, -5.0, 89.0)))
+    # Every branch is evaluated, so the unused ones may divide by zero at 0 degrees
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arcseconds = np.where(
+            elevation > 5.0, 58.1 / tan_e - 0.07 / tan_e ** 3 + 0.000086 / tan_e ** 5,
+            np.where(elevation > -0.575,
+                     1735.0 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711))),
+                     -20.772 / tan_e))
+    return np.where(elevation > 85.0, 0.0, arcseconds / 3600.0)
+
+
+def iter_sun_positions(latitude, longitude, start, end, step=np.timedelta64(1, "m"),
+                       chunk_size=10080, refraction=False):
+    """
+    Yields (times, azimuth, elevation) arrays for the UTC instants from start to
+    end (exclusive) every step, chunk_size instants at a time (a week of minutes
+    by default). Each chunk is evaluated vectorized, so memory stays flat however
+    long the window is.
+    """
+    step = np.timedelta64(step).astype("timedelta64[s]")
+    chunk_start = np.datetime64(start, "s")
+    end = np.datetime64(end, "s")
+    while chunk_start < end:
+        times = np.arange(chunk_start, min(chunk_start + chunk_size * step, end), step)
+        azimuth, elevation = sun_position(latitude, longitude, times, refraction)
+        yield times, azimuth, elevation
+        chunk_start = times[-1] + step
+
+
+def clear_sky_irradiance(latitude, longitude, times, elevation_m=0.0, sun_elevation=None):
+    """
+    Returns a dictionary of clear-sky "ghi" (global horizontal), "dni" (direct
+    normal) and "dhi" (diffuse horizontal) irradiance in W/m^2 at the given UTC
+    instants, broadcasting locations against times like sun_position. Direct
+    irradiance follows Meinel's model with Laue's site-height correction and the
+    Kasten-Young air mass, scaled by the Earth-Sun distance; diffuse is taken as
+    a tenth of direct. Pass sun_elevation (apparent, degrees) to reuse a series
+    already computed with sun_position(..., refraction=True).
+    """
+    times = np.asarray(times, dtype="datetime64[s]")
+    if sun_elevation is None:
+        _, sun_elevation = sun_position(latitude, longitude, times, refraction=True)
+    sun_elevation = np.asarray(sun_elevation, dtype=float)
+    up = sun_elevation > 0.0
+    positive = np.where(up, sun_elevation, 90.0)
+
+    air_mass = 1.0 / (np.sin(np.radians(positive)) + 0.50572 * (positive + 6.07995) ** -1.6364)
+    height = np.asarray(elevation_m, dtype=float) / 1000.0
+    beam = (1.0 - 0.14 * height) * 0.7 ** (air_mass ** 0.678) + 0.14 * height
+
+    day_of_year = (times - times.astype("datetime64[Y]")).astype("timedelta64[D]").astype(np.int64) + 1
+    extraterrestrial = SOLAR_CONSTANT * (1.0 + 0.033 * np.cos(2.0 * np.pi * day_of_year / 365.0))
+    dni = np.where(up, extraterrestrial * (MEINEL_SOLAR_CONSTANT / SOLAR_CONSTANT) * beam, 0.0)
+    dhi = 0.1 * dni
+    ghi = dni * np.sin(np.radians(np.where(up, sun_elevation, 0.0))) + dhi
+    return {"ghi": ghi, "dni": dni, "dhi": dhi}
+
+
+def day_lengths(events):
+    """
+    Returns the daylight minutes (sunset minus sunrise) for results of
+    sun_events_for_dates or sun_events_for_locations: 1440 under the midnight
+    sun and 0 in polar night.
+    """
+    length = events["sunset"] - events["sunrise"]
+    length = np.where(events["never_sets"], 1440.0, length)
+    return np.where(events["never_rises"], 0.0, length)
+
+
+def annual_extremes(latitude, longitude, year, utc_offset=0.0, elevation_m=0.0, refine_days=3):
+    """
+    Returns the yearly extremes for a location: earliest/latest sunrise and
+    sunset and shortest/longest day. The whole year is scanned in one pass with
+    the fast tier, then refine_days either side of each candidate are recomputed
+    with the precise tier to pick the exact date.
+    Returns a dictionary of (date, minutes) pairs; NaT and NaN mean the event
+    does not happen that year (e.g. sunrise at the pole).
+    """
+    dates = date_range(_new_year(year), _new_year(year + 1) - 1)
+    fast = sun_events_for_dates(latitude, longitude, dates, utc_offset, precision="fast",
+                                elevation_m=elevation_m)
+    fast["day_length"] = day_lengths(fast)
+
+    # (result name, quantity, True for the minimum)
+    extremes = (("earliest_sunrise", "sunrise", True), ("latest_sunrise", "sunrise", False),
+                ("earliest_sunset", "sunset", True), ("latest_sunset", "sunset", False),
+                ("shortest_day", "day_length", True), ("longest_day", "day_length", False))
+
+    results = {}
+    for name, quantity, minimum in extremes:
+        values = fast[quantity]
+        if np.isnan(values).all():
+            results[name] = (np.datetime64("NaT", "D"), np.nan)
+            continue
+        candidate = np.nanargmin(values) if minimum else np.nanargmax(values)
+
+        # Refine around the candidate with the precise tier, staying inside the year
+        window = dates[max(candidate - refine_days, 0):candidate + refine_days + 1]
+        precise = sun_events_for_dates(latitude, longitude, window, utc_offset,
+                                       elevation_m=elevation_m)
+        precise["day_length"] = day_lengths(precise)
+        values = precise[quantity]
+        best = np.nanargmin(values) if minimum else np.nanargmax(values)
+        results[name] = (window[best], float(values[best]))
+    return results
+
+
+def compact_minutes(minutes, dtype=np.float32, out=None):
+    """
+    Converts event times (float minutes, NaN for no event) to a compact dtype:
+    float32 keeps NaN, int16 rounds to whole minutes and uses NO_EVENT_MINUTES.
+    Writes into out when given.
+    """
+    dtype = np.dtype(dtype)
+    if out is None:
+        out = np.empty(np.shape(minutes), dtype=dtype)
+    if dtype.kind == "f":
+        np.copyto(out, minutes, casting="same_kind")
+    else:
+        np.copyto(out, np.where(np.isnan(minutes), NO_EVENT_MINUTES, np.rint(minutes)), casting="unsafe")
+    return out
+
+
+def expand_minutes(compact):
+    """Converts compact event times back to float64 minutes with NaN for no event."""
+    compact = np.asarray(compact)
+    if compact.dtype.kind == "f":
+        return compact.astype(np.float64)
+    return np.where(compact == NO_EVENT_MINUTES, np.nan, compact.astype(np.float64))
+
+
+def sun_event_grid(latitudes, longitudes, dates, utc_offset=0.0, dtype=np.float32, out=None,
+                   precision="precise"):
+    """
+    Computes the five daily events for a grid of locations over many dates into a
+    compact array shaped (dates, events, *locations), in the order of EVENTS.
+    dtype is float32 (NaN for no event) or int16 (whole minutes, NO_EVENT_MINUTES
+    for no event); out can be a preallocated array of that shape and dtype.
+    Only one date's float64 temporaries exist at a time, so the result costs a
+    half (float32) or a quarter (int16) of the float64 equivalent; out can also be
+    an np.memmap for grids larger than memory. precision="fast" is about three
+    times quicker but first and last light can then be ten minutes off at 60
+    degrees latitude (see PRECISION_TIERS), far more than int16 rounding.
+    """
+    latitudes, longitudes = np.broadcast_arrays(np.asarray(latitudes, dtype=float),
+                                                np.asarray(longitudes, dtype=float))
+    dates = np.asarray(dates, dtype="datetime64[D]").reshape(-1)
+    shape = (len(dates), len(EVENTS)) + latitudes.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+    for index, day in enumerate(dates):
+        events = sun_events(latitudes, longitudes, day, utc_offset, precision=precision)
+        for event_index, (name, _, _) in enumerate(EVENTS):
+            compact_minutes(events[name], out.dtype, out[index, event_index])
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def lookup_table():
+    """
+    Returns the precomputed event table, shaped (events, latitudes, days) in the
+    order of EVENTS: minutes after 0h UT at longitude 0 for each latitude band
+    and each day of LOOKUP_REFERENCE_YEAR (plus one day either side).
+    It is generated on first use, saved in CACHE_DIR and then memory-mapped.
+    """
+    path = os.path.join(CACHE_DIR, f"lookup_{LOOKUP_REFERENCE_YEAR}_{LOOKUP_LATITUDE_STEP}.npy")
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+
+    latitudes = np.arange(-90.0, 90.0 + LOOKUP_LATITUDE_STEP / 2, LOOKUP_LATITUDE_STEP)[:, np.newaxis]
+    days = date_range(f"{LOOKUP_REFERENCE_YEAR - 1}-12-31", f"{LOOKUP_REFERENCE_YEAR + 1}-01-01")
+    table = np.stack([event_time(latitudes, 0.0, days, 0.0, altitude, rising)
+                      for _, altitude, rising in EVENTS]).astype(np.float32)
+    if _write_cache_file(path, lambda cache_file: np.save(cache_file, table)):
+        return np.load(path, mmap_mode="r")
+    return table
+
+
+def table_sun_events(latitude, longitude, day, utc_offset=0.0):
+    """
+    Returns the five daily events like sun_events, but read from lookup_table by
+    bilinear interpolation in latitude and time of year, without any ephemeris
+    math. Longitude is handled analytically: it shifts the clock by 4 minutes per
+    degree and the sun's position by the same fraction of a day.
+    Accuracy is LOOKUP_MAX_ERROR_MINUTES for |latitude| <= 60 degrees.
+    """
+    table = lookup_table()
+    longitude = np.asarray(longitude, dtype=float)
+
+    # Fractional row for the latitude band
+    row = (np.clip(np.asarray(latitude, dtype=float), -90.0, 90.0) + 90.0) / LOOKUP_LATITUDE_STEP
+    row0 = np.minimum(np.floor(row).astype(np.int64), table.shape[1] - 2)
+    row_weight = row - row0
+
+    # Fractional column: the same point of the tropical year in the reference year
+    # (column 1 is January 1), moved by the time the event happens away from longitude 0
+    reference = julian_day(f"{LOOKUP_REFERENCE_YEAR}-01-01")
+    phase = (julian_day(day) - reference) % TROPICAL_YEAR_DAYS
+    column = 1.0 + phase - longitude / 360.0
+    column0 = np.floor(column).astype(np.int64)
+    column_weight = column - column0
+
+    offset_minutes = np.asarray(utc_offset, dtype=float) * 60.0 - 4.0 * longitude
+    events = {}
+    for index, (name, _, _) in enumerate(EVENTS):
+        values = table[index]
+        top = values[row0, column0] * (1 - column_weight) + values[row0, column0 + 1] * column_weight
+        bottom = values[row0 + 1, column0] * (1 - column_weight) + values[row0 + 1, column0 + 1] * column_weight
+        events[name] = top * (1 - row_weight) + bottom * row_weight + offset_minutes
+    return events
+
+
+def horizon_profile(skyline_altitudes):
+    """
+    Packs skyline altitudes (degrees, one per equal azimuth bin clockwise from
+    north) into the compact int16 form used by obstructed_sun_events.
+    """
+    return np.round(np.asarray(skyline_altitudes, dtype=float) * HORIZON_PROFILE_SCALE).astype(np.int16)
+
+
+def skyline_altitude(profile, azimuth):
+    """Returns the skyline altitude (degrees) at the given azimuths, interpolated between bin centres."""
+    bins = len(profile)
+    centres = (np.arange(bins) + 0.5) * 360.0 / bins
+    return np.interp(azimuth, centres, np.asarray(profile) / HORIZON_PROFILE_SCALE, period=360.0)
+
+
+def obstructed_sun_events(latitude, longitude, dates, profile, utc_offset=0.0, step_minutes=1.0,
+                          elevation_m=0.0, pressure=STANDARD_PRESSURE, temperature=STANDARD_TEMPERATURE):
+    """
+    Returns when the sun actually clears the terrain (upper limb above the
+    skyline in horizon_profile form) for one location over one or more dates.
+    The sun's path is sampled every step_minutes over each local day, all dates
+    at once, and each crossing is refined by linear interpolation. The sun is
+    compared with the skyline lowered by the same allowance as horizon_altitude
+    (semi-diameter, refraction for pressure and temperature, dip for elevation_m),
+    with the refraction reduced above the horizon in proportion to the NOAA
+    refraction curve, so a flat zero skyline reproduces sun_events.
+    Returns a dictionary with "sunrise" and "sunset" (first and last moment the
+    sun is visible, minutes after local midnight, NaN if never) and
+    "visible_minutes" (total time the sun is visible, which excludes any midday
+    spells behind a peak).
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    minutes = np.arange(0.0, 1440.0 + step_minutes / 2, step_minutes)
+    local_midnight = dates[..., np.newaxis].astype("datetime64[s]") - np.timedelta64(int(round(utc_offset * 3600)), "s")
+    times = local_midnight + (minutes * 60).astype("timedelta64[s]")
+
+    azimuth, elevation = sun_position(latitude, longitude, times)
+    skyline = skyline_altitude(profile, azimuth)
+    refraction = -(horizon_altitude(0.0, pressure, temperature) + SUN_SEMI_DIAMETER)
+    refraction_scale = atmospheric_refraction(skyline) / atmospheric_refraction(0.0)
+    threshold = skyline + horizon_altitude(elevation_m, pressure, temperature) + refraction * (1.0 - refraction_scale)
+    clearance = elevation - threshold
+    visible = clearance > 0
+
+    # Crossing minute between the last hidden and first visible sample (and vice versa)
+    def crossing(index):
+        before = np.take_along_axis(clearance, index[..., np.newaxis], axis=-1)[..., 0]
+        after = np.take_along_axis(clearance, index[..., np.newaxis] + 1, axis=-1)[..., 0]
+        return minutes[index] + step_minutes * before / (before - after)
+
+    any_visible = visible.any(axis=-1)
+    first = visible.argmax(axis=-1)
+    last = visible.shape[-1] - 1 - visible[..., ::-1].argmax(axis=-1)
+    sunrise = np.where(first > 0, crossing(np.maximum(first - 1, 0)), minutes[0])
+    sunset = np.where(last < len(minutes) - 1, crossing(np.minimum(last, len(minutes) - 2)), minutes[-1])
+    return {"sunrise": np.where(any_visible, sunrise, np.nan),
+            "sunset": np.where(any_visible, sunset, np.nan),
+            "visible_minutes": visible[..., :-1].sum(axis=-1) * step_minutes}
+
+
+def _track_position(seconds, track_seconds, track_latitudes, track_longitudes):
+    """Interpolates a track (longitudes already unwrapped) at the given seconds since 1970."""
+    latitude = np.interp(seconds, track_seconds, track_latitudes)
+    longitude = np.interp(seconds, track_seconds, track_longitudes)
+    return latitude, (longitude + 180.0) % 360.0 - 180.0
+
+
+def track_crossings(times, latitudes, longitudes, altitude=SUNRISE_ALTITUDE, step_seconds=60,
+                    refine_iterations=2):
+    """
+    Finds every time the sun crosses the given altitude along a moving observer's
+    track (timestamped UTC positions, e.g. a ship's or aircraft's log).
+    The track is interpolated every step_seconds, the solar elevation is evaluated
+    for all samples in one vectorized pass, and each bracketed crossing is refined
+    by regula falsi on the interpolated path. Longitudes may cross the date line.
+    Returns a dictionary of arrays: "time" (datetime64[s] UTC), "latitude",
+    "longitude" and "rising" (True for sunrise-type crossings).
+    """
+    track_seconds = np.asarray(times, dtype="datetime64[s]").astype(np.int64).astype(float)
+    track_latitudes = np.asarray(latitudes, dtype=float)
+    track_longitudes = np.degrees(np.unwrap(np.radians(np.asarray(longitudes, dtype=float))))
+
+    def height(seconds):
+        latitude, longitude = _track_position(seconds, track_seconds, track_latitudes, track_longitudes)
+        instants = np.rint(seconds).astype(np.int64).astype("datetime64[s]")
+        return sun_position(latitude, longitude, instants)[1] - altitude
+
+    samples = np.arange(track_seconds[0], track_seconds[-1] + step_seconds, step_seconds, dtype=float)
+    samples[-1] = min(samples[-1], track_seconds[-1])
+    heights = height(samples)
+
+    # Brackets where the sun goes from below to above the altitude, or back
+    sign = heights > 0
+    brackets = np.flatnonzero(sign[:-1] != sign[1:])
+    low, high = samples[brackets], samples[brackets + 1]
+    low_height, high_height = heights[brackets], heights[brackets + 1]
+    for _ in range(refine_iterations):
+        middle = low - low_height * (high - low) / (high_height - low_height)
+        middle_height = height(middle)
+        same_side = (middle_height > 0) == (low_height > 0)
+        low = np.where(same_side, middle, low)
+        low_height = np.where(same_side, middle_height, low_height)
+        high = np.where(same_side, high, middle)
+        high_height = np.where(same_side, high_height, middle_height)
+    crossing = low - low_height * (high - low) / (high_height - low_height)
+
+    latitude, longitude = _track_position(crossing, track_seconds, track_latitudes, track_longitudes)
+    return {"time": np.rint(crossing).astype(np.int64).astype("datetime64[s]"),
+            "latitude": latitude,
+            "longitude": longitude,
+            "rising": ~sign[brackets]}
+
+
+def classify_daylight(times, latitudes, longitudes, chunk_size=1_000_000):
+    """
+    Classifies each row of timestamp/coordinate columns as DAY (sun above the
+    sunrise altitude), CIVIL_TWILIGHT (down to 6 degrees below the horizon) or
+    NIGHT. times are UTC instants; the columns broadcast against each other.
+    Rows are evaluated chunk_size at a time into an int8 array.
+    """
+    times, latitudes, longitudes = np.broadcast_arrays(np.asarray(times, dtype="datetime64[s]"),
+                                                       np.asarray(latitudes, dtype=float),
+                                                       np.asarray(longitudes, dtype=float))
+    flat = [column.reshape(-1) for column in (times, latitudes, longitudes)]
+    classes = np.empty(flat[0].shape, dtype=np.int8)
+    for start in range(0, len(classes), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        _, elevation = sun_position(flat[1][chunk], flat[2][chunk], flat[0][chunk])
+        classes[chunk] = np.where(elevation > SUNRISE_ALTITUDE, DAY,
+                                  np.where(elevation > CIVIL_ALTITUDE, CIVIL_TWILIGHT, NIGHT))
+    return classes.reshape(times.shape)
+
+
+def _light_minutes(latitude, longitude, dates, utc_offset, altitude):
+    """
+    Minutes per solar day (midnight to midnight around local solar noon) with the
+    sun above altitude (1440 or 0 when it never crosses it).
+    """
+    rising = event_time(latitude, longitude, dates, utc_offset, altitude, True)
+    setting = event_time(latitude, longitude, dates, utc_offset, altitude, False)
+    never_rises, never_sets = polar_masks(latitude, longitude, dates, altitude)
+
+    # Near a polar day the sun can stay above altitude through one of the two
+    # solar midnights, so that day has only one crossing; count from or to midnight
+    longitude = np.asarray(longitude, dtype=float)
+    _, eq_time = interpolate_ephemeris(
+        ephemeris_polynomials(np.asarray(dates, dtype="datetime64[D]").astype(np.int64)), 0.5 - longitude / 360.0)
+    noon = 720.0 - 4.0 * longitude - eq_time + np.asarray(utc_offset, dtype=float) * 60.0
+    rising = np.where(np.isnan(rising), noon - 720.0, rising)
+    setting = np.where(np.isnan(setting), noon + 720.0, setting)
+    return np.where(never_rises, 0.0, np.where(never_sets, 1440.0, setting - rising))
+
+
+def daylight_totals(latitudes, longitudes, start, end, period="month", utc_offset=0.0):
+    """
+    Returns total daylight and civil twilight hours per "day", "week" (ISO weeks,
+    starting on Monday), "month" or "year" from start to end (inclusive), for one
+    location or arrays of them. Daily durations for all sites and dates come from
+    one vectorized pass and are summed per period with cumulative sums.
+    Returns a dictionary with "period_start" (the first date of each period in
+    the range) and "daylight_hours" and "twilight_hours", shaped like the
+    locations plus a last axis with one entry per period.
+    """
+    dates = date_range(start, end)
+    latitudes = np.asarray(latitudes, dtype=float)[..., np.newaxis]
+    longitudes = np.asarray(longitudes, dtype=float)[..., np.newaxis]
+    utc_offset = np.asarray(utc_offset, dtype=float)[..., np.newaxis]
+
+    daylight = _light_minutes(latitudes, longitudes, dates, utc_offset, SUNRISE_ALTITUDE)
+    civil_light = _light_minutes(latitudes, longitudes, dates, utc_offset, CIVIL_ALTITUDE)
+
+    # Index of the first date of each period
+    if period == "day":
+        keys = dates.astype(np.int64)
+    elif period == "week":
+        keys = (dates.astype(np.int64) + 3) // 7
+    elif period == "month":
+        keys = dates.astype("datetime64[M]").astype(np.int64)
+    elif period == "year":
+        keys = dates.astype("datetime64[Y]").astype(np.int64)
+    else:
+        raise ValueError(f"Unknown period: {period}")
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(dates)]
+
+    def period_sums(minutes):
+        totals = np.concatenate([np.zeros(minutes.shape[:-1] + (1,)), np.cumsum(minutes, axis=-1)], axis=-1)
+        return (totals[..., ends] - totals[..., starts]) / 60.0
+
+    daylight_hours = period_sums(daylight)
+    return {"period_start": dates[starts],
+            "daylight_hours": daylight_hours,
+            "twilight_hours": period_sums(civil_light) - daylight_hours}
+
+
+def alignment_dates(latitude, longitude, azimuth, start, end, utc_offset=0.0,
+                    events=("sunrise", "sunset"), elevation_m=0.0):
+    """
+    Finds the dates from start to end on which the sun rises or sets at the given
+    azimuth (degrees clockwise from north), e.g. to line up with a street.
+    The event azimuth is computed for every date in one vectorized pass; each
+    date-to-date bracket that passes the target is solved by linear interpolation
+    and reported as the closer of its two dates.
+    Returns a dictionary of arrays sorted by date: "date", "event", "time"
+    (minutes after local midnight) and "azimuth" (of the event on that date).
+    """
+    dates = date_range(start, end)
+    results = sun_events_for_dates(latitude, longitude, dates, utc_offset, elevation_m=elevation_m)
+    found = {"date": [], "event": [], "time": [], "azimuth": []}
+
+    for event in events:
+        minutes = results[event]
+        instants = (dates.astype("datetime64[s]")
+                    + np.rint((minutes - utc_offset * 60.0) * 60.0).astype(np.int64).astype("timedelta64[s]"))
+        event_azimuth, _ = sun_position(latitude, longitude, instants)
+
+        # Signed difference to the target, wrapped to [-180, 180); NaN on polar dates
+        difference = np.where(np.isnan(minutes), np.nan, (event_azimuth - azimuth + 180.0) % 360.0 - 180.0)
+        before, after = difference[:-1], difference[1:]
+        with np.errstate(invalid="ignore"):
+            # Same-sign pairs and jumps across the wrap (on the far side of the sky) are skipped
+            brackets = np.flatnonzero((np.sign(before) != np.sign(after)) & (np.abs(after - before) < 90.0))
+        fraction = before[brackets] / (before[brackets] - after[brackets])
+        index = brackets + (fraction > 0.5)
+        # A date exactly on the target closes two brackets; keep it once
+        index = np.unique(index)
+
+        found["date"].append(dates[index])
+        found["event"].append(np.full(len(index), event))
+        found["time"].append(minutes[index])
+        found["azimuth"].append(event_azimuth[index])
+
+    found = {key: np.concatenate(values) for key, values in found.items()}
+    order = np.argsort(found["date"], kind="stable")
+    return {key: values[order] for key, values in found.items()}
+
+
+def subsolar_point(times):
+    """Returns the latitude and longitude (degrees) of the point with the sun overhead at the given UTC instant(s)."""
+    times = np.asarray(times, dtype="datetime64[s]")
+    declination, eq_time = solar_ephemeris_at(times)
+    utc_minutes = (times.astype(np.int64) % 86400) / 60.0
+    longitude = (720.0 - utc_minutes - eq_time) / 4.0
+    return declination, (longitude + 180.0) % 360.0 - 180.0
+
+
+def terminator(times, altitude=SUNRISE_ALTITUDE, points=361):
+    """
+    Returns the latitudes and longitudes (degrees) of a closed polyline of points
+    where the sun is at the given altitude at the given UTC instant(s): the
+    day/night terminator by default, or a twilight boundary with CIVIL_ALTITUDE,
+    NAUTICAL_ALTITUDE or ASTRONOMICAL_ALTITUDE. The line is the small circle of
+    radius 90 - altitude degrees around the subsolar point, sampled at equal
+    bearings along a trailing axis of length points; longitudes are wrapped to
+    [-180, 180), so a map drawing should split the line where they jump.
+    """
+    sub_latitude, sub_longitude = subsolar_point(times)
+    lat = np.radians(sub_latitude)[..., np.newaxis]
+    bearing = np.radians(np.linspace(0.0, 360.0, points))
+    distance = np.radians(90.0 - altitude)
+
+    latitudes = np.arcsin(np.sin(lat) * np.cos(distance) + np.cos(lat) * np.sin(distance) * np.cos(bearing))
+    longitudes = np.degrees(np.arctan2(np.sin(bearing) * np.sin(distance) * np.cos(lat),
+                                       np.cos(distance) - np.sin(lat) * np.sin(latitudes)))
+    longitudes = (longitudes + sub_longitude[..., np.newaxis] + 180.0) % 360.0 - 180.0
+    return np.degrees(latitudes), longitudes
+
+
+def terminator_raster(time, latitudes, longitudes, dtype=np.float32):
+    """
+    Returns the sun's elevation (degrees, no refraction) at one UTC instant on the
+    grid of 1-D latitudes (rows) by longitudes (columns). The sun's position is
+    computed once and the grid is an outer product, with no per-point solving.
+    Pass the result to twilight_bands to shade it.
+    """
+    sub_latitude, sub_longitude = subsolar_point(time)
+    lat = np.radians(np.asarray(latitudes, dtype=float))[:, np.newaxis]
+    ha = np.radians(np.asarray(longitudes, dtype=float) - sub_longitude)
+    dec = np.radians(sub_latitude)
+    sin_elevation = np.sin(lat) * np.sin(dec) + (np.cos(lat) * np.cos(dec)) * np.cos(ha)
+    return np.degrees(np.arcsin(np.clip(sin_elevation, -1.0, 1.0))).astype(dtype)
+
+
+def twilight_bands(elevation):
+    """
+    Returns an int8 array indexing TWILIGHT_BANDS for each sun elevation (degrees):
+    0 night, 1 astronomical twilight, 2 nautical twilight, 3 civil twilight, 4 day.
+    """
+    boundaries = [ASTRONOMICAL_ALTITUDE, NAUTICAL_ALTITUDE, CIVIL_ALTITUDE, SUNRISE_ALTITUDE]
+    return np.digitize(elevation, boundaries, right=True).astype(np.int8)
+
+
+def site_event_index(latitudes, longitudes, start, end, events=("sunrise", "sunset"), precision="precise",
+                     elevation_m=0.0):
+    """
+    Builds an index for sites_at_events: the UTC instants of the named events
+    (any of EVENT_DEFINITIONS) for every site on every UTC date from start to end
+    (inclusive), solved once in a vectorized pass and sorted per event. Cover the
+    query windows with a day's margin on each side, and rebuild the index as time
+    moves on. Returns a dictionary of (times, sites) pairs keyed by event, where
+    times are sorted datetime64[s] values and sites are the matching site indices.
+    """
+    latitudes = np.asarray(latitudes, dtype=float).reshape(-1)
+    longitudes = np.asarray(longitudes, dtype=float).reshape(-1)
+    dates = date_range(start, end)
+    altitudes = event_altitudes(elevation_m)
+    sites = np.broadcast_to(np.arange(latitudes.size)[:, np.newaxis], (latitudes.size, dates.size))
+    midnights = dates.astype("datetime64[s]").astype(np.int64)
+
+    index = {}
+    for event in events:
+        _, rising = EVENT_DEFINITIONS[event]
+        minutes = event_time(latitudes[:, np.newaxis], longitudes[:, np.newaxis], dates,
+                             altitude=np.asarray(altitudes[event])[..., np.newaxis], rising=rising,
+                             precision=precision)
+        happens = ~np.isnan(minutes)
+        seconds = (midnights + np.round(np.where(happens, minutes, 0.0) * 60.0).astype(np.int64))[happens]
+        order = np.argsort(seconds, kind="stable")
+        index[event] = (seconds[order].astype("datetime64[s]"), sites[happens][order])
+    return index
+
+
+def sites_at_events(index, start, end):
+    """
+    Returns the sites whose events fall in the UTC window [start, end), using an
+    index from site_event_index: each event is two binary searches, however many
+    sites are indexed. Returns a dictionary of (sites, times) pairs keyed by event,
+    in time order.
+    """
+    start, end = np.datetime64(start, "s"), np.datetime64(end, "s")
+    found = {}
+    for event, (times, sites) in index.items():
+        first, last = np.searchsorted(times, [start, end])
+        found[event] = (sites[first:last], times[first:last])
+    return found
+
+
+def moon_position(jd):
+    """
+    Returns the Moon's right ascension and declination (degrees), horizontal
+    parallax (degrees) and ecliptic longitude (degrees) at the given Julian
+    day(s), from the low-precision series of the Astronomical Almanac.
+    """
+    t = (np.asarray(jd, dtype=float) - JD_J2000) / 36525.0
+
+    def sin_deg(a, b):
+        return np.sin(np.radians(a + b * t))
+
+    def cos_deg(a, b):
+        return np.cos(np.radians(a + b * t))
+
+    longitude = (218.32 + 481267.881 * t + 6.29 * sin_deg(135.0, 477198.87) - 1.27 * sin_deg(259.3, -413335.36)
+                 + 0.66 * sin_deg(235.7, 890534.22) + 0.21 * sin_deg(269.9, 954397.74)
+                 - 0.19 * sin_deg(357.5, 35999.05) - 0.11 * sin_deg(186.5, 966404.03))
+    latitude = (5.13 * sin_deg(93.3, 483202.02) + 0.28 * sin_deg(228.2, 960400.89)
+                - 0.28 * sin_deg(318.3, 6003.15) - 0.17 * sin_deg(217.6, -407332.21))
+    parallax = (0.9508 + 0.0518 * cos_deg(135.0, 477198.87) + 0.0095 * cos_deg(259.3, -413335.36)
+                + 0.0078 * cos_deg(235.7, 890534.22) + 0.0028 * cos_deg(269.9, 954397.74))
+
+    # Ecliptic to equatorial coordinates
+    lam, beta = np.radians(longitude), np.radians(latitude)
+    obliquity = np.radians(23.439 - 0.013 * t)
+    ra = np.degrees(np.arctan2(np.sin(lam) * np.cos(obliquity) - np.tan(beta) * np.sin(obliquity), np.cos(lam)))
+    dec = np.degrees(np.arcsin(np.sin(beta) * np.cos(obliquity) + np.cos(beta) * np.sin(obliquity) * np.sin(lam)))
+    return ra % 360.0, dec, parallax, longitude % 360.0
+
+
+def greenwich_sidereal_time(jd):
+    """Returns the Greenwich mean sidereal time (degrees) at the given Julian day(s)."""
+    d = np.asarray(jd, dtype=float) - JD_J2000
+    t = d / 36525.0
+    return (280.46061837 + 360.98564736629 * d + 0.000387933 * t * t) % 360.0
+
+
+def _moon_nodes_for_jd(jd):
+    """Moon right ascension (unwrapped), declination and parallax at hourly nodes along the last axis."""
+    ra, dec, parallax, _ = moon_position(terrestrial_time(jd))
+    return np.degrees(np.unwrap(np.radians(ra), axis=-1)), dec, parallax
+
+
+@functools.lru_cache(maxsize=EPHEMERIS_CACHE_SIZE)
+def _cached_moon_nodes(day_number):
+    """Returns the hourly Moon nodes for one date (days since 1970-01-01)."""
+    nodes = _moon_nodes_for_jd(JD_UNIX_EPOCH + day_number + MOON_SAMPLE_HOURS / 24.0)
+    for node in nodes:
+        node.flags.writeable = False
+    return nodes
+
+
+def moon_nodes(day_number):
+    """
+    Returns the Moon's hourly (right ascension, declination, parallax) nodes at
+    MOON_SAMPLE_HOURS around a date or array of dates. Like ephemeris_polynomials,
+    a single date is computed once, cached and shared by every location.
+    """
+    if np.ndim(day_number) == 0:
+        return _cached_moon_nodes(int(day_number))
+    jd = JD_UNIX_EPOCH + np.asarray(day_number)[..., np.newaxis] + MOON_SAMPLE_HOURS / 24.0
+    return _moon_nodes_for_jd(jd)
+
+
+def _moon_altitude(latitude, longitude, day_number, nodes, ut_hours):
+    """
+    Returns the Moon's altitude above its rise/set altitude (degrees) at ut_hours
+    after 0h UT of day_number, interpolating the hourly nodes linearly.
+    """
+    position = np.clip(ut_hours - MOON_SAMPLE_HOURS[0], 0.0, len(MOON_SAMPLE_HOURS) - 1.000001)
+    index = position.astype(np.int64)
+    weight = position - index
+    shape = np.broadcast_shapes(index.shape[:-1], nodes[0].shape[:-1]) + index.shape[-1:]
+    index = np.broadcast_to(index, shape)
+    ra, dec, parallax = (
+        np.take_along_axis(np.broadcast_to(node, shape[:-1] + node.shape[-1:]), index, axis=-1) * (1 - weight)
+        + np.take_along_axis(np.broadcast_to(node, shape[:-1] + node.shape[-1:]), index + 1, axis=-1) * weight
+        for node in nodes)
+
+    jd = JD_UNIX_EPOCH + np.asarray(day_number)[..., np.newaxis] + ut_hours / 24.0
+    ha = np.radians(greenwich_sidereal_time(jd) + np.asarray(longitude)[..., np.newaxis] - ra)
+    lat = np.radians(np.asarray(latitude)[..., np.newaxis])
+    dec = np.radians(dec)
+    altitude = np.degrees(np.arcsin(np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(ha)))
+    # Upper limb on the horizon, seen from the surface: parallax, semi-diameter and refraction
+    return altitude - (0.7275 * parallax - HORIZON_REFRACTION)
+
+
+def moon_events(latitude, longitude, day, utc_offset=0.0, refine_iterations=2):
+    """
+    Returns a dictionary with the "moonrise" and "moonset" times (minutes after
+    local midnight, NaN when there is none that day, which happens about once a
+    month) and the Moon's "illumination" (fraction lit) and "phase" (degrees:
+    0 new, 90 first quarter, 180 full, 270 last quarter) at local noon.
+    The Moon's altitude is sampled hourly through the local day for every
+    location and date at once, and each crossing is refined by regula falsi.
+    """
+    day_number = np.asarray(day, dtype="datetime64[D]").astype(np.int64)
+    latitude, longitude, offset, day_number = np.broadcast_arrays(
+        np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float),
+        np.asarray(utc_offset, dtype=float), day_number)
+    nodes = moon_nodes(day_number if day_number.ndim == 0 or np.ptp(day_number) else int(day_number.flat[0]))
+
+    hours = np.arange(25.0) - offset[..., np.newaxis]
+    heights = _moon_altitude(latitude, longitude, day_number, nodes, hours)
+    above = heights > 0
+
+    events = {}
+    for name, rising in (("moonrise", True), ("moonset", False)):
+        crossings = (~above[..., :-1] & above[..., 1:]) if rising else (above[..., :-1] & ~above[..., 1:])
+        found = crossings.any(axis=-1)
+        index = crossings.argmax(axis=-1)[..., np.newaxis]
+        low = np.take_along_axis(hours, index, axis=-1)
+        high = low + 1.0
+        low_height = np.take_along_axis(heights, index, axis=-1)
+        high_height = np.take_along_axis(heights, index + 1, axis=-1)
+        for _ in range(refine_iterations):
+            middle = low - low_height * (high - low) / (high_height - low_height)
+            middle_height = _moon_altitude(latitude, longitude, day_number, nodes, middle)
+            same_side = (middle_height > 0) == (low_height > 0)
+            low, low_height = np.where(same_side, middle, low), np.where(same_side, middle_height, low_height)
+            high, high_height = np.where(same_side, high, middle), np.where(same_side, high_height, middle_height)
+        crossing = (low - low_height * (high - low) / (high_height - low_height))[..., 0]
+        events[name] = np.where(found, (crossing + offset) * 60.0, np.nan)
+
+    # Phase from the Moon's elongation east of the Sun (low-precision solar longitude)
+    jd = JD_UNIX_EPOCH + day_number + (12.0 - offset) / 24.0
+    d = jd - JD_J2000
+    mean_anomaly = np.radians(357.528 + 0.9856003 * d)
+    sun_longitude = 280.460 + 0.9856474 * d + 1.915 * np.sin(mean_anomaly) + 0.020 * np.sin(2 * mean_anomaly)
+    phase = (moon_position(terrestrial_time(jd))[3] - sun_longitude) % 360.0
+    events["phase"] = phase
+    events["illumination"] = (1.0 - np.cos(np.radians(phase))) / 2.0
+    return events
+
+
+def moon_events_for_dates(latitude, longitude, dates, utc_offset=0.0):
+    """Returns moon_events for one location over an array of dates; "date" holds the dates."""
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    events = moon_events(float(latitude), float(longitude), dates, utc_offset)
+    events["date"] = dates
+    return events
+
+
+def moon_events_for_locations(latitudes, longitudes, day, utc_offset=0.0):
+    """Returns moon_events for many locations on one date, sharing that date's cached Moon nodes."""
+    return moon_events(latitudes, longitudes, np.datetime64(day, "D"), utc_offset)
@@ -32,14 +32,32 @@ def main():
     # Maybe the default should be set to today instead of doing this in the function in the following line, but need to format properly
     parser.add_argument("--date_arg", nargs='?', default=None, help="Date to get information for (in MM-DD format (or DD-MM if that format selected) or relative date like t+5 or t-3)")
     parser.add_argument("--DDMMformat", action="store_true", help="Use DD-MM date format instead of MM-DD")
+    parser.add_argument("--elevation", type=float, default=0.0, help="Your elevation in metres, for the local engine's sunrise/sunset")
+    parser.add_argument("--precision", choices=["fast", "precise"], default=None, help="Accuracy of the local engine: fast (about a minute) or precise (seconds, the default)")
+    parser.add_argument("--moon", action="store_true", help="Also print moonrise, moonset and the Moon's illumination (local and table engines)")
     parser.add_argument("--log", action="store_true", help="Enable logging")
+    parser.add_argument("--engine", choices=["api", "local", "table"], default="api", help="Get the times from the sunrisesunset.io API, compute them locally, or look them up in a precomputed local table")
 
     # Parse the arguments
     args = parser.parse_args()
+    # The lookup table is precomputed at sea level with the precise solver
+    if args.engine == "table" and (args.elevation or args.precision):
+        parser.error("--elevation and --precision cannot be used with --engine table")
+    # The API engine computes its own times
+    if args.engine == "api" and args.precision:
+        parser.error("--precision requires --engine local")
+    if args.engine == "api" and args.elevation:
+        parser.error("--elevation requires --engine local")
+    if args.engine == "api" and args.moon:
+        parser.error("--moon requires --engine local or --engine table")
     api_key = args.api_key
     date = args.date_arg
     use_DDMMformat = args.DDMMformat
     log_enabled = args.log
+    engine = args.engine
+    precision = args.precision or "precise"
+    elevation_m = args.elevation
+    show_moon = args.moon
    
     # Check if the API key is provided; if not, exit with an error message
     if not api_key:
@@ -73,7 +91,11 @@ def main():
         print("Error: Could not retrieve UTC offset.")
         sys.exit(1)
 
-    print_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset)
+    if engine in ("local", "table"):
+        print_local_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset, precision, elevation_m,
+                                        use_table=(engine == "table"), show_moon=show_moon)
+    else:
+        print_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset)
 
 def print_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset):
     """Fetches and prints sunrise/sunset data."""
@@ -88,15 +110,7 @@ def print_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset):
         response.raise_for_status()
         data = response.json()
 
-        date_object = datetime.strptime(data["results"]["date"], "%Y-%m-%d")
-        verbose_date = date_object.strftime("%A, %B %d, %Y")
-
-        print(f"On {verbose_date}:")
-        print(f"First light at: {data['results']['first_light']}")
-        print(f"Dawn at: {data['results']['dawn']}")
-        print(f"Sunrise at: {data['results']['sunrise']}")
-        print(f"Sunset at: {data['results']['sunset']}")
-        print(f"Last light at: {data['results']['last_light']}")
+        print_results(data["results"])
 
     except requests.exceptions.RequestException as e:
         print(f"Error: Could not retrieve sunrise/sunset data: {e}")
@@ -106,6 +120,63 @@ def print_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset):
         sys.exit(1)
 
 
+def print_local_sunrise_sunset_data(latitude, longitude, formatted_date, utc_offset, precision="precise", elevation_m=0.0,
+                                    use_table=False, show_moon=False):
+    """
+    Computes sunrise/sunset data locally (no network) and prints it.
+    With use_table, the times are interpolated from the precomputed lookup table instead
+    (sea level only, accurate to about half a minute), and elevation_m must be 0. With show_moon, moonrise, moonset
+    and the Moon's illumination are printed as well.
+    """
+    # Imported here so the default API engine does not pay for loading NumPy
+    import numpy as np
+    import SolarEngine
+
+    if use_table:
+        if elevation_m:
+            raise ValueError("The lookup table only covers sea level")
+        events = SolarEngine.table_sun_events(latitude, longitude, formatted_date, utc_offset)
+    else:
+        events = SolarEngine.sun_events(latitude, longitude, formatted_date, utc_offset, precision=precision,
+                                        elevation_m=elevation_m)
+    results = {name: SolarEngine.format_time(minutes) for name, minutes in events.items()}
+    results["date"] = formatted_date
+
+    print_results(results)
+
+    # In polar night or midnight sun, say so and show when the sun next rises or sets
+    never_rises, never_sets = SolarEngine.polar_masks(latitude, longitude, formatted_date,
+                                                      SolarEngine.horizon_altitude(elevation_m))
+    if never_rises or never_sets:
+        event = "sunrise" if never_rises else "sunset"
+        print(f"The sun does not {'rise' if never_rises else 'set'} on this date.")
+        next_date, next_minutes = SolarEngine.next_event(latitude, longitude, formatted_date, utc_offset, event,
+                                                         precision=precision, elevation_m=elevation_m)
+        if not np.isnat(next_date):
+            verbose_date = next_date.item().strftime("%A, %B %d, %Y")
+            print(f"Next {event}: {verbose_date} at {SolarEngine.format_time(next_minutes)}")
+
+    if show_moon:
+        moon = SolarEngine.moon_events(latitude, longitude, formatted_date, utc_offset)
+        print(f"Moonrise at: {SolarEngine.format_time(moon['moonrise'])}")
+        print(f"Moonset at: {SolarEngine.format_time(moon['moonset'])}")
+        print(f"Moon illumination: {float(moon['illumination']):.0%}")
+
+
+def print_results(results):
+    """Prints the sunrise/sunset results, given in the same form as the API's "results"."""
+
+    date_object = datetime.strptime(results["date"], "%Y-%m-%d")
+    verbose_date = date_object.strftime("%A, %B %d, %Y")
+
+    print(f"On {verbose_date}:")
+    print(f"First light at: {results['first_light']}")
+    print(f"Dawn at: {results['dawn']}")
+    print(f"Sunrise at: {results['sunrise']}")
+    print(f"Sunset at: {results['sunset']}")
+    print(f"Last light at: {results['last_light']}")
+
+
 def get_location(log_enabled): 
     """Gets the user's latitude and longitude."""
     try:
@@ -271,7 +342,9 @@ def transform_date(arg, use_DDMMformat):
 if __name__ == "__main__":
     main()
 # The script can be run from the command line with the following command:
-# python SunriseSunset.py <API_KEY> [--date_arg <DATE>] [--DDMMformat] [--log]
+# python SunriseSunset.py <API_KEY> [--date_arg <DATE>] [--DDMMformat] [--log] [--engine {api,local,table}] [--precision {fast,precise}] [--elevation <METRES>] [--moon]
 # Example usage:
 #   python SunriseSunset.py 041RVIVT3U52 --date_arg t+5 --DDMMformat --log
 #   python SunriseSunset.py 041RVIVT3U52 --date_arg t+5 --log
+#   python SunriseSunset.py 041RVIVT3U52 --date_arg t+5 --engine local
+#   python SunriseSunset.py 041RVIVT3U52 --date_arg t+5 --engine local --moon
@@ -0,0 +1,122 @@
+"""
+Benchmarks for the local solar engine in SolarEngine.py.
+Run with: python benchmark.py
+Each benchmark prints the best time of several runs for the compared approaches.
+"""
+
+# Import libraries
+import os
+import subprocess
+import sys
+import timeit
+import numpy as np
+import SolarEngine
+
+
+# Function definitions
+def best_time(func, repeat=5):
+    """Returns the best wall-clock time (seconds) of several calls to func."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def report(label, seconds, baseline=None):
+    """Prints one benchmark result, with the speedup over baseline if given."""
+    line = f"  {label:<40} {seconds * 1000:10.2f} ms"
+    if baseline:
+        line += f"   ({baseline / seconds:.1f}x)"
+    print(line)
+
+
+def benchmark_chebyshev():
+    """Full ephemeris series versus the cached per-year Chebyshev fits."""
+    print("Ephemeris for 1,000,000 instants in one year:")
+    rng = np.random.default_rng(0)
+    jd = SolarEngine.julian_day("2025-01-01") + rng.random(1_000_000) * 365
+
+    # The first call fits (or loads) the coefficients; time only the evaluation
+    SolarEngine.chebyshev_ephemeris(jd)
+    series = best_time(lambda: SolarEngine.solar_ephemeris(jd))
+    report("series (solar_ephemeris)", series)
+    report("chebyshev (chebyshev_ephemeris)", best_time(lambda: SolarEngine.chebyshev_ephemeris(jd)), series)
+
+    print("Five daily events for one site over ten years:")
+    dates = SolarEngine.date_range("2020-01-01", "2029-12-31")
+    series = best_time(lambda: SolarEngine.sun_events_for_dates(40.71, -74.01, dates, -5))
+    report("series", series)
+    report("chebyshev", best_time(
+        lambda: SolarEngine.sun_events_for_dates(40.71, -74.01, dates, -5, ephemeris="chebyshev")), series)
+
+
+def benchmark_precision():
+    """The "fast" and "precise" tiers, timed and compared with each other."""
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-60, 60, 300_000)
+    longitudes = rng.uniform(-180, 180, 300_000)
+    print("Five daily events for 300,000 sites on one date:")
+    precise = best_time(lambda: SolarEngine.sun_events_for_locations(latitudes, longitudes, "2025-03-20"))
+    report("precise", precise)
+    report("fast", best_time(lambda: SolarEngine.sun_events_for_locations(
+        latitudes, longitudes, "2025-03-20", precision="fast")), precise)
+
+    print("Five daily events for one site over ten years:")
+    dates = SolarEngine.date_range("2020-01-01", "2029-12-31")
+    precise = best_time(lambda: SolarEngine.sun_events_for_dates(40.71, -74.01, dates, -5))
+    report("precise", precise)
+    report("fast", best_time(lambda: SolarEngine.sun_events_for_dates(
+        40.71, -74.01, dates, -5, precision="fast")), precise)
+
+    print("Largest difference between the tiers over 2025 (minutes):")
+    dates = SolarEngine.date_range("2025-01-01", "2025-12-31")
+    for latitude in (0, 30, 45, 60):
+        precise = SolarEngine.sun_events_for_dates(latitude, 0, dates)
+        fast = SolarEngine.sun_events_for_dates(latitude, 0, dates, precision="fast")
+        errors = {name: np.nanmax(np.abs(fast[name] - precise[name])) for name, _, _ in SolarEngine.EVENTS}
+        print(f"  latitude {latitude:>3}: sunrise/sunset {max(errors['sunrise'], errors['sunset']):.2f}, "
+              f"all events {max(errors.values()):.2f}")
+
+
+def benchmark_jit():
+    """The Numba-compiled event kernel versus the NumPy implementation, warm and from a cold start."""
+    if SolarEngine.compiled_event_kernel() is None:
+        print("Numba is not installed; skipping the JIT benchmark.")
+        return
+    rng = np.random.default_rng(0)
+    latitudes = rng.uniform(-60, 60, 300_000)
+    longitudes = rng.uniform(-180, 180, 300_000)
+
+    for label, func in (("Five daily events for one site (CLI path), warm:",
+                         lambda: SolarEngine.sun_events(40.71, -74.01, "2025-03-20", -5)),
+                        ("Five daily events for 300,000 sites on one date:",
+                         lambda: SolarEngine.sun_events(latitudes, longitudes, "2025-03-20"))):
+        print(label)
+        threshold = SolarEngine.JIT_MIN_ELEMENTS
+        try:
+            SolarEngine.USE_JIT = False
+            numpy_time = best_time(func)
+            SolarEngine.USE_JIT = True
+            SolarEngine.JIT_MIN_ELEMENTS = 0
+            report("NumPy", numpy_time)
+            report("Numba", best_time(func), numpy_time)
+        finally:
+            SolarEngine.USE_JIT = True
+            SolarEngine.JIT_MIN_ELEMENTS = threshold
+
+    # A fresh interpreter per run: importing the module and the first call, as the CLI does
+    print("Import and one site's events in a new process (CLI start-up):")
+    code = ("import SolarEngine; SolarEngine.JIT_MIN_ELEMENTS = {}; "
+            "SolarEngine.sun_events(40.71, -74.01, '2025-03-20', -5)")
+    here = os.path.dirname(os.path.abspath(__file__))
+    numpy_time = best_time(lambda: subprocess.run([sys.executable, "-c", code.format(10 ** 12)], cwd=here, check=True), 3)
+    report("NumPy", numpy_time)
+    report("Numba (loaded from its cache)",
+           best_time(lambda: subprocess.run([sys.executable, "-c", code.format(0)], cwd=here, check=True), 3), numpy_time)
+
+
+def main():
+    benchmark_chebyshev()
+    benchmark_precision()
+    benchmark_jit()
+
+
+if __name__ == "__main__":
+    main()